@@ -3,27 +3,41 @@ Real-time Email Phishing Detection API
 Flask REST API for detecting phishing emails in real-time
 """
 
-from flask import Flask, request, jsonify
-import sys
+from flask import Flask, Response, request, jsonify, stream_with_context
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import MappingProxyType
 import os
-import pandas as pd
+import numpy as np
+import orjson
 
-from src.feature_extractor import EmailFeatureExtractor
-from src.phishing_detector import PhishingDetector
+from src.feature_extractor import EmailFeatureExtractor, FEATURE_NAMES
+from src.phishing_detector import PhishingDetector, MODEL_TYPES
 from src.email_notifier import EmailNotifier
 
 app = Flask(__name__)
 
 # Initialize components
 feature_extractor = EmailFeatureExtractor()
-detector = PhishingDetector()
+# PHISHING_THRESHOLD trades precision for recall without retraining
+detector = PhishingDetector(threshold=float(os.getenv('PHISHING_THRESHOLD', '0.5')))
+# Requests are scored as bare vectors in FEATURE_NAMES order
+detector.check_feature_order(FEATURE_NAMES)
 notifier = EmailNotifier()
 
-# Try to load pre-trained model
-try:
-    detector.load_model()
+# Worker threads for per-email feature extraction in /batch-detect
+extraction_pool = ThreadPoolExecutor(max_workers=min(32, os.cpu_count() or 1))
+
+# Fields every email sent to /detect must provide
+REQUIRED_FIELDS = ('subject', 'body', 'sender')
+
+# Emails scored per predict call when streaming /batch-detect results
+STREAM_CHUNK_SIZE = 256
+
+# PhishingDetector loads the pre-trained model on construction when it exists
+if os.path.exists(detector.model_path):
     print("✓ Pre-trained model loaded successfully")
-except FileNotFoundError:
+else:
     print("⚠ No pre-trained model found. Please train the model first using train_model.py")
 
 # Check email notification status
@@ -32,34 +46,43 @@ if notifier.enabled:
 else:
     print("ℹ️ Email notifications disabled (configure .env to enable)")
 
+# Static responses are serialized once at startup
+_HOME_BYTES = orjson.dumps({
+    'service': 'Email Phishing Detection API',
+    'version': '1.0',
+    'status': 'running',
+    'notifications_enabled': notifier.enabled,
+    'endpoints': {
+        '/detect': 'POST - Detect phishing in email',
+        '/batch-detect': 'POST - Detect phishing in multiple emails',
+        '/health': 'GET - Check API health',
+        '/model/info': 'GET - Get model information',
+        '/notifications/test': 'GET - Test notification configuration',
+        '/notifications/send-test': 'POST - Send test phishing alert'
+    }
+})
+_HEALTH_BYTES = {
+    model_loaded: orjson.dumps({'status': 'healthy', 'model_loaded': model_loaded})
+    for model_loaded in (True, False)
+}
+
+
+def json_response(payload, status=200):
+    """Serialize a payload with orjson into a JSON response"""
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
 
 @app.route('/')
 def home():
     """API home page"""
-    return jsonify({
-        'service': 'Email Phishing Detection API',
-        'version': '1.0',
-        'status': 'running',
-        'notifications_enabled': notifier.enabled,
-        'endpoints': {
-            '/detect': 'POST - Detect phishing in email',
-            '/batch-detect': 'POST - Detect phishing in multiple emails',
-            '/health': 'GET - Check API health',
-            '/model/info': 'GET - Get model information',
-            '/notifications/test': 'GET - Test notification configuration',
-            '/notifications/send-test': 'POST - Send test phishing alert'
-        }
-    })
+    return Response(_HOME_BYTES, mimetype='application/json')
 
 
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     model_loaded = detector.model is not None
-    return jsonify({
-        'status': 'healthy',
-        'model_loaded': model_loaded
-    })
+    return Response(_HEALTH_BYTES[model_loaded], mimetype='application/json')
 
 
 @app.route('/detect', methods=['POST'])
@@ -78,35 +101,33 @@ def detect_phishing():
     try:
         # Check if model is loaded
         if detector.model is None:
-            return jsonify({
+            return json_response({
                 'error': 'Model not loaded. Please train the model first.'
-            }), 503
+            }, 503)
         
         # Get email data from request
         email_data = request.get_json()
         
         # Validate required fields
         if not email_data:
-            return jsonify({'error': 'No JSON data provided'}), 400
-        
-        required_fields = ['subject', 'body', 'sender']
-        missing_fields = [field for field in required_fields if field not in email_data]
+            return json_response({'error': 'No JSON data provided'}, 400)
         
-        if missing_fields:
-            return jsonify({
+        if 'subject' not in email_data or 'body' not in email_data or 'sender' not in email_data:
+            missing_fields = [field for field in REQUIRED_FIELDS if field not in email_data]
+            return json_response({
                 'error': f'Missing required fields: {", ".join(missing_fields)}'
-            }), 400
+            }, 400)
         
-        # Extract features
-        features = feature_extractor.extract_features(email_data)
-        
-        # Make prediction
+        # Extract features and make prediction; the extractor caches the
+        # features of repeated emails (campaign blasts, newsletters) by digest
+        features = feature_extractor.extract_feature_vector(email_data)
         prediction = detector.predict(features)
         
         # Send notification if phishing detected
+        # Alerts are queued and sent in the background so SMTP never blocks
         notification_sent = False
-        if prediction['is_phishing']:
-            notification_sent = notifier.send_phishing_alert(email_data, prediction)
+        if prediction['is_phishing'] and notifier.queue_phishing_alert(email_data, prediction):
+            notification_sent = 'queued'
         
         # Prepare response
         response = {
@@ -121,16 +142,16 @@ def detect_phishing():
             'recommendation': get_recommendation(prediction),
             'features_analyzed': len(features),
             'notification_sent': notification_sent,
-            'timestamp': pd.Timestamp.now().isoformat()
+            'timestamp': datetime.now(timezone.utc).isoformat()
         }
         
-        return jsonify(response), 200
+        return json_response(response, 200)
     
     except Exception as e:
-        return jsonify({
+        return json_response({
             'error': 'Internal server error',
             'message': str(e)
-        }), 500
+        }, 500)
 
 
 @app.route('/batch-detect', methods=['POST'])
@@ -138,7 +159,10 @@ def batch_detect():
     """
     Detect phishing in multiple emails
     
-    Expected JSON payload:
+    Add ?stream=true to receive results as NDJSON, one line per email,
+    while the batch is still being processed.
+    
+    Expected JSON payload (or just the list of emails):
     {
         "emails": [
             {
@@ -152,66 +176,60 @@ def batch_detect():
     """
     try:
         if detector.model is None:
-            return jsonify({
+            return json_response({
                 'error': 'Model not loaded. Please train the model first.'
-            }), 503
+            }, 503)
         
         data = request.get_json()
         
-        if not data or 'emails' not in data:
-            return jsonify({'error': 'No emails provided'}), 400
+        # Accept either {"emails": [...]} or a bare JSON array of emails
+        if isinstance(data, list):
+            emails = data
+        elif isinstance(data, dict) and 'emails' in data:
+            emails = data['emails']
+        else:
+            return json_response({'error': 'No emails provided'}, 400)
         
-        emails = data['emails']
-        results = []
+        # Checked before any streamed response starts: once its headers
+        # are sent, a bad payload could only cut the stream off
+        if not isinstance(emails, list):
+            return json_response({'error': '"emails" must be a list of emails'}, 400)
         
-        for idx, email_data in enumerate(emails):
-            try:
-                features = feature_extractor.extract_features(email_data)
-                prediction = detector.predict(features)
-                
-                results.append({
-                    'index': idx,
-                    'subject': email_data.get('subject', ''),
-                    'prediction': prediction['prediction'],
-                    'confidence': round(prediction['confidence'] * 100, 2),
-                    'risk_level': prediction['risk_level']
-                })
-            except Exception as e:
-                results.append({
-                    'index': idx,
-                    'error': str(e)
-                })
+        # Stream NDJSON (one result per line) when asked, for large batches
+        if request.args.get('stream', '').lower() in ('1', 'true'):
+            return Response(
+                stream_with_context(_stream_batch_results(emails)),
+                mimetype='application/x-ndjson'
+            )
         
-        return jsonify({
+        results = _detect_emails(emails)
+        
+        return json_response({
             'total_emails': len(emails),
             'results': results
-        }), 200
+        }, 200)
     
     except Exception as e:
-        return jsonify({
+        return json_response({
             'error': 'Internal server error',
             'message': str(e)
-        }), 500
+        }, 500)
 
 
 @app.route('/model/info', methods=['GET'])
 def model_info():
     """Get model information and feature importance"""
     try:
-        if detector.model is None:
+        if detector.model is None or detector.top_features is None:
             return jsonify({
                 'error': 'Model not loaded'
             }), 503
         
-        feature_importance = detector.get_feature_importance()
-        
-        # Get top 10 most important features
-        top_features = dict(list(feature_importance.items())[:10])
-        
+        # Top 10 features are computed once when the model is loaded
         return jsonify({
-            'model_type': 'Random Forest Classifier',
-            'n_features': len(feature_importance),
-            'top_features': top_features,
+            'model_type': MODEL_TYPES[detector.model_type],
+            'n_features': detector.n_features,
+            'top_features': detector.top_features,
             'model_loaded': True
         }), 200
     
@@ -270,19 +288,89 @@ def send_test_notification():
         }), 400
 
 
+def _detect_emails(emails, offset=0):
+    """
+    Run detection on a list of emails with one stacked predict call
+    
+    Args:
+        emails (list): Email dicts to analyze
+        offset (int): Index of the first email within the whole request
+    
+    Returns:
+        list: One result (or error) dict per email, in input order
+    """
+    results = [None] * len(emails)
+    
+    # Phase 1: extract features, recording per-email failures
+    if len(emails) < 3:
+        outcomes = map(_extract_features_safe, emails)
+    else:
+        outcomes = extraction_pool.map(_extract_features_safe, emails)
+    
+    extracted = []
+    for idx, (features, error) in enumerate(outcomes):
+        if error is None:
+            extracted.append((idx, features))
+        else:
+            results[idx] = {
+                'index': offset + idx,
+                'error': error
+            }
+    
+    # Phase 2: one stacked predict call for every extracted email
+    if extracted:
+        X = np.stack([features for _, features in extracted])
+        predictions = detector.predict_batch(X)
+        
+        for (idx, _), prediction in zip(extracted, predictions):
+            results[idx] = {
+                'index': offset + idx,
+                'subject': emails[idx].get('subject', ''),
+                'prediction': prediction['prediction'],
+                'confidence': round(prediction['confidence'] * 100, 2),
+                'risk_level': prediction['risk_level']
+            }
+    
+    return results
+
+
+def _stream_batch_results(emails):
+    """Yield NDJSON result lines, detecting STREAM_CHUNK_SIZE emails at a time"""
+    for start in range(0, len(emails), STREAM_CHUNK_SIZE):
+        chunk = emails[start:start + STREAM_CHUNK_SIZE]
+        try:
+            results = _detect_emails(chunk, offset=start)
+        except Exception as e:
+            results = [{'index': start + idx, 'error': str(e)} for idx in range(len(chunk))]
+        
+        for result in results:
+            yield orjson.dumps(result) + b'\n'
+
+
+def _extract_features_safe(email_data):
+    """Extract features, returning (features, None) or (None, error message)"""
+    try:
+        return feature_extractor.extract_feature_vector(email_data), None
+    except Exception as e:
+        return None, str(e)
+
+
+# Recommendation shown for each risk level
+RECOMMENDATIONS = MappingProxyType({
+    'CRITICAL': "⛔ DO NOT interact with this email. Delete immediately and report as phishing.",
+    'HIGH': "⚠️ High risk of phishing. Verify sender before taking any action.",
+    'MEDIUM': "⚡ Exercise caution. Verify sender and don't click suspicious links.",
+    'LOW': "✓ Low risk, but always verify before clicking links or downloading attachments.",
+    'SAFE': "✅ Email appears safe, but always practice good email security."
+})
+
+
 def get_recommendation(prediction):
     """Get recommendation based on prediction"""
-    if prediction['risk_level'] == 'CRITICAL':
-        return "⛔ DO NOT interact with this email. Delete immediately and report as phishing."
-    elif prediction['risk_level'] == 'HIGH':
-        return "⚠️ High risk of phishing. Verify sender before taking any action."
-    elif prediction['risk_level'] == 'MEDIUM':
-        return "⚡ Exercise caution. Verify sender and don't click suspicious links."
-    elif prediction['risk_level'] == 'LOW':
-        return "✓ Low risk, but always verify before clicking links or downloading attachments."
-    else:
-        return "✅ Email appears safe, but always practice good email security."
+    return RECOMMENDATIONS.get(prediction['risk_level'], RECOMMENDATIONS['SAFE'])
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Debug mode (reloader + interactive tracebacks) only when asked for
+    debug = os.getenv('FLASK_DEBUG', '0') == '1'
+    app.run(debug=debug, threaded=True, host='0.0.0.0', port=5000)
@@ -134,6 +134,48 @@ def get_training_data():
     """Get all training data as list"""
     return PHISHING_EMAILS + LEGITIMATE_EMAILS
 
+def export_training_data(path='data/emails.parquet'):
+    """Write the sample emails to a zstd-compressed Parquet file"""
+    import pandas as pd
+    
+    pd.DataFrame(get_training_data()).to_parquet(path, compression='zstd', index=False)
+
+def count_training_data(path=None):
+    """
+    Number of training emails, without loading them
+    
+    Counts the built-in sample emails, or the rows of a Parquet file
+    from its metadata.
+    """
+    if path is None:
+        return len(PHISHING_EMAILS) + len(LEGITIMATE_EMAILS)
+    
+    import pyarrow.parquet as pq
+    
+    return pq.ParquetFile(path).metadata.num_rows
+
+def iter_training_data(path=None, batch_size=1024):
+    """
+    Yield training emails one at a time
+    
+    Yields the built-in sample emails, or streams a Parquet file with
+    subject, body, sender and label columns (as written by
+    export_training_data(); requires pyarrow) in record batches of
+    batch_size rows, so the whole dataset never has to be in memory.
+    """
+    if path is None:
+        yield from PHISHING_EMAILS
+        yield from LEGITIMATE_EMAILS
+        return
+    
+    import pyarrow.parquet as pq
+    
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(
+        batch_size=batch_size, columns=['subject', 'body', 'sender', 'label']
+    ):
+        yield from batch.to_pylist()
+
 def get_phishing_emails():
     """Get only phishing emails"""
     return PHISHING_EMAILS
@@ -8,6 +8,9 @@ import json
 
 API_URL = "http://localhost:5000"
 
+# Reuse one keep-alive connection for every API call
+SESSION = requests.Session()
+
 def print_section(title):
     """Print a formatted section header"""
     print("\n" + "=" * 70)
@@ -19,7 +22,7 @@ def test_notification_config():
     print_section("Testing Email Notification Configuration")
     
     try:
-        response = requests.get(f"{API_URL}/notifications/test")
+        response = SESSION.get(f"{API_URL}/notifications/test")
         result = response.json()
         
         if result['status'] == 'success':
@@ -48,7 +51,7 @@ def send_test_alert():
     print_section("Sending Test Phishing Alert")
     
     try:
-        response = requests.post(f"{API_URL}/notifications/send-test")
+        response = SESSION.post(f"{API_URL}/notifications/send-test")
         result = response.json()
         
         if result['status'] == 'success':
@@ -77,7 +80,7 @@ def test_phishing_detection_with_notification():
     print(f"   Subject: {phishing_email['subject']}")
     
     try:
-        response = requests.post(f"{API_URL}/detect", json=phishing_email)
+        response = SESSION.post(f"{API_URL}/detect", json=phishing_email)
         result = response.json()
         
         print(f"\n🤖 Detection Result:")
@@ -86,7 +89,7 @@ def test_phishing_detection_with_notification():
         print(f"   Risk Level: {result['risk_level']}")
         
         if result.get('notification_sent', False):
-            print(f"\n✅ Notification sent to admin!")
+            print(f"\n✅ Notification queued for admin!")
             print(f"   📧 Check your email for the phishing alert")
         else:
             print(f"\nℹ️ No notification sent")
@@ -113,7 +116,7 @@ def test_legitimate_email():
     print(f"   Subject: {legitimate_email['subject']}")
     
     try:
-        response = requests.post(f"{API_URL}/detect", json=legitimate_email)
+        response = SESSION.post(f"{API_URL}/detect", json=legitimate_email)
         result = response.json()
         
         print(f"\n🤖 Detection Result:")
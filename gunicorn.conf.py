@@ -0,0 +1,39 @@
+"""
+Gunicorn configuration for the phishing detection API
+Run with: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import multiprocessing
+import os
+
+# Keep native math libraries single-threaded; parallelism comes from workers
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+os.environ.setdefault('MKL_NUM_THREADS', '1')
+os.environ.setdefault('OPENBLAS_NUM_THREADS', '1')
+os.environ.setdefault('NUMBA_NUM_THREADS', '1')
+os.environ.setdefault('TL2CGEN_NUM_THREADS', '1')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', '2'))
+
+# Load the app (and the trained model) once in the master so workers
+# share it copy-on-write instead of each loading their own copy
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Make the preloaded model safe and lean to use inside a worker"""
+    from app import detector
+    
+    # One thread per prediction; workers already use every core
+    if detector.model is not None and hasattr(detector.model, 'n_jobs'):
+        detector.model.n_jobs = 1
+    
+    # ONNX Runtime sessions are not fork-safe, so open a fresh one per worker
+    if detector.onnx_session is not None:
+        detector._load_onnx_session(detector.model_path)
+    
+    # Same for the compiled tree library's thread pool (TL2CGEN_NUM_THREADS)
+    if detector.compiled_predictor is not None:
+        detector._load_compiled_predictor(detector.model_path)
@@ -2,28 +2,30 @@
 Quick start script - Runs the complete setup and test
 """
 
-import subprocess
+import asyncio
 import sys
 import os
 
 
-def run_command(description, command):
-    """Run a command and display output"""
+async def run_command(description, *command):
+    """Run a command, streaming its output as it is produced"""
     print("\n" + "=" * 70)
     print(f"⚡ {description}")
     print("=" * 70)
     
-    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT
+    )
     
-    if result.stdout:
-        print(result.stdout)
-    if result.stderr:
-        print(result.stderr)
+    async for line in process.stdout:
+        print(line.decode(errors='replace'), end='', flush=True)
     
-    return result.returncode == 0
+    return await process.wait() == 0
 
 
-def main():
+async def main():
     print("""
     ╔══════════════════════════════════════════════════════════════╗
     ║                                                              ║
@@ -37,9 +39,9 @@ def main():
     
     # Step 1: Install dependencies
     print("\n[STEP 1/3] Installing dependencies...")
-    success = run_command(
+    success = await run_command(
         "Installing required packages",
-        f"{sys.executable} -m pip install -r requirements.txt"
+        sys.executable, '-m', 'pip', 'install', '-r', 'requirements.txt'
     )
     
     if not success:
@@ -48,9 +50,9 @@ def main():
     
     # Step 2: Train model
     print("\n[STEP 2/3] Training the phishing detection model...")
-    success = run_command(
+    success = await run_command(
         "Training machine learning model",
-        f"{sys.executable} train_model.py"
+        sys.executable, 'train_model.py'
     )
     
     if not success:
@@ -59,9 +61,9 @@ def main():
     
     # Step 3: Run tests
     print("\n[STEP 3/3] Running tests...")
-    success = run_command(
+    success = await run_command(
         "Testing the detection system",
-        f"{sys.executable} test_detector.py"
+        sys.executable, 'test_detector.py'
     )
     
     print("\n" + "=" * 70)
@@ -76,4 +78,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    asyncio.run(main())
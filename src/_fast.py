@@ -0,0 +1,105 @@
+"""
+Compiled kernels for feature extraction and forest prediction
+Uses numba when it is installed; otherwise the kernels are None and
+callers fall back to their NumPy implementation
+"""
+
+import string
+import numpy as np
+
+try:
+    import numba
+    from numba import njit, prange
+except ImportError:  # numba is an optional accelerator
+    njit = None
+
+
+# Rows from which predict_forest splits a batch across threads; smaller
+# batches are not worth the thread hand-off
+PARALLEL_MIN_ROWS = 1024
+
+# Parallel kernels may run from several request threads at once, which
+# aborts the process under numba's workqueue layer. Only the TBB ("safe")
+# layer allows that, so parallel scoring is used only when TBB is present
+_parallel_safe = False
+if njit is not None:
+    try:
+        from numba.np.ufunc import tbbpool  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        numba.config.THREADING_LAYER = 'safe'
+        _parallel_safe = True
+
+
+# 1 for every ASCII punctuation byte, 0 otherwise
+_PUNCT_TABLE = np.zeros(256, dtype=np.uint8)
+_PUNCT_TABLE[np.frombuffer(string.punctuation.encode(), dtype=np.uint8)] = 1
+
+
+if njit is not None:
+    @njit(cache=True, nogil=True)
+    def char_stats(buf):
+        """
+        Count punctuation, digit and uppercase bytes in one loop
+
+        Args:
+            buf: uint8 array of UTF-8 text
+
+        Returns:
+            tuple: (special, digits, uppercase)
+        """
+        special = digits = uppercase = 0
+        for i in range(buf.size):
+            c = buf[i]
+            if 48 <= c <= 57:
+                digits += 1
+            elif 65 <= c <= 90:
+                uppercase += 1
+            else:
+                special += _PUNCT_TABLE[c]
+        return special, digits, uppercase
+
+    @njit(cache=True, nogil=True, inline='always')
+    def _forest_row(X, i, roots, feature, threshold, left, right, leaf_value):
+        """Mean leaf value over all trees for row i of X"""
+        total = 0.0
+        for t in range(roots.size):
+            node = roots[t]
+            while feature[node] >= 0:
+                if X[i, feature[node]] <= threshold[node]:
+                    node = left[node]
+                else:
+                    node = right[node]
+            total += leaf_value[node]
+        return total / roots.size
+
+    @njit(cache=True, nogil=True)
+    def _predict_forest_serial(X, roots, feature, threshold, left, right, leaf_value):
+        out = np.empty(X.shape[0])
+        for i in range(X.shape[0]):
+            out[i] = _forest_row(X, i, roots, feature, threshold, left, right, leaf_value)
+        return out
+
+    @njit(parallel=True, cache=True, nogil=True)
+    def _predict_forest_parallel(X, roots, feature, threshold, left, right, leaf_value):
+        out = np.empty(X.shape[0])
+        for i in prange(X.shape[0]):
+            out[i] = _forest_row(X, i, roots, feature, threshold, left, right, leaf_value)
+        return out
+
+    def predict_forest(X, roots, feature, threshold, left, right, leaf_value):
+        """
+        Mean leaf value over all trees of a flattened forest, per row of X
+
+        Large batches are scored in parallel when a thread-safe threading
+        layer is available; see PhishingDetector.compile_flat_forest for
+        the array layout.
+        """
+        kernel = _predict_forest_serial
+        if _parallel_safe and X.shape[0] >= PARALLEL_MIN_ROWS:
+            kernel = _predict_forest_parallel
+        return kernel(X, roots, feature, threshold, left, right, leaf_value)
+else:
+    char_stats = None
+    predict_forest = None
@@ -3,20 +3,144 @@ Email notification system for phishing detection alerts
 Sends notifications to admin when phishing emails are detected
 """
 
+import atexit
+import html
 import smtplib
+import ssl
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 import os
+import queue
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Alert header color for each risk level
+RISK_COLORS = {
+    'CRITICAL': '#dc3545',
+    'HIGH': '#fd7e14',
+    'MEDIUM': '#ffc107',
+    'LOW': '#0dcaf0',
+    'SAFE': '#28a745'
+}
+
+# Recommendation included in alerts for each risk level
+RECOMMENDATIONS = {
+    'CRITICAL': "⛔ IMMEDIATE ACTION REQUIRED: Delete this email immediately and report it to your security team. Do not click any links or download attachments.",
+    'HIGH': "⚠️ HIGH RISK: This email is highly suspicious. Verify the sender through an alternative communication channel before taking any action.",
+    'MEDIUM': "⚡ CAUTION ADVISED: Exercise extreme caution with this email. Verify all information before clicking links or providing any data.",
+    'LOW': "✓ LOW RISK: While the risk is low, remain vigilant and verify sender authenticity before taking action.",
+    'SAFE': "✅ This email appears safe, but always practice good email security habits."
+}
+
+# Plain text alert body, filled in with str.format_map
+TEXT_TEMPLATE = """
+PHISHING EMAIL DETECTED
+========================
+
+Detection Time: {timestamp}
+Risk Level: {risk_level}
+Confidence: {confidence:.2f}%
+
+EMAIL DETAILS:
+--------------
+From: {sender}
+Subject: {subject}
+
+Body Preview:
+{body_preview}...
+
+RECOMMENDATION:
+{recommendation}
+
+---
+This is an automated alert from the Email Phishing Detection System.
+"""
+
+# HTML alert body, filled in with str.format_map (CSS braces are doubled)
+HTML_TEMPLATE = """
+        <html>
+          <head>
+            <style>
+              body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+              .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+              .header {{ background-color: {risk_color}; color: white; padding: 20px; border-radius: 5px 5px 0 0; }}
+              .content {{ background-color: #f8f9fa; padding: 20px; border: 1px solid #dee2e6; }}
+              .detail-row {{ margin: 10px 0; }}
+              .label {{ font-weight: bold; color: #495057; }}
+              .value {{ color: #212529; }}
+              .footer {{ background-color: #e9ecef; padding: 10px; text-align: center; font-size: 12px; color: #6c757d; border-radius: 0 0 5px 5px; }}
+              .risk-badge {{ display: inline-block; padding: 5px 10px; background-color: {risk_color}; color: white; border-radius: 3px; font-weight: bold; }}
+              .email-preview {{ background-color: white; padding: 15px; margin: 10px 0; border-left: 4px solid {risk_color}; }}
+            </style>
+          </head>
+          <body>
+            <div class="container">
+              <div class="header">
+                <h2>🚨 PHISHING EMAIL DETECTED</h2>
+              </div>
+              <div class="content">
+                <div class="detail-row">
+                  <span class="label">Detection Time:</span>
+                  <span class="value">{timestamp}</span>
+                </div>
+                <div class="detail-row">
+                  <span class="label">Risk Level:</span>
+                  <span class="risk-badge">{risk_level}</span>
+                </div>
+                <div class="detail-row">
+                  <span class="label">Confidence:</span>
+                  <span class="value">{confidence:.2f}%</span>
+                </div>
+                
+                <h3>Email Details</h3>
+                <div class="detail-row">
+                  <span class="label">From:</span>
+                  <span class="value">{sender}</span>
+                </div>
+                <div class="detail-row">
+                  <span class="label">Subject:</span>
+                  <span class="value">{subject}</span>
+                </div>
+                
+                <h3>Body Preview</h3>
+                <div class="email-preview">
+                  {body_preview}...
+                </div>
+                
+                <h3>Recommendation</h3>
+                <div class="email-preview">
+                  {recommendation}
+                </div>
+              </div>
+              <div class="footer">
+                This is an automated alert from the Email Phishing Detection System
+              </div>
+            </div>
+          </body>
+        </html>
+        """
+
 
 class EmailNotifier:
     """Send email notifications for phishing detections"""
     
+    # Minimum phishing confidence that triggers an alert
+    ALERT_CONFIDENCE_THRESHOLD = 0.6
+    
+    # Reconnect after this many messages; providers cap messages per session
+    MAX_MESSAGES_PER_CONNECTION = 100
+    
+    # Alerts waiting for the background sender; more are dropped when full
+    MAX_QUEUED_ALERTS = 1000
+    
+    # Seconds close() waits for queued alerts to be sent before dropping them
+    SHUTDOWN_TIMEOUT = 10
+    
     def __init__(self):
         """Initialize email notifier with credentials from environment variables"""
         self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
@@ -26,6 +150,22 @@ class EmailNotifier:
         self.admin_email = os.getenv('ADMIN_EMAIL', '')
         self.enabled = os.getenv('EMAIL_NOTIFICATIONS_ENABLED', 'false').lower() == 'true'
         
+        # TLS context is built once and reused for every connection
+        self.tls_context = ssl.create_default_context()
+        
+        # Persistent SMTP connection shared by all alerts
+        self._smtp = None
+        self._smtp_messages = 0
+        self._smtp_lock = threading.Lock()
+        
+        # Background delivery queue, drained by a lazily started thread
+        self._alert_queue = queue.Queue(maxsize=self.MAX_QUEUED_ALERTS)
+        self._sender_thread = None
+        self._sender_lock = threading.Lock()
+        self._accepting_alerts = True  # False once close() has started
+        self._close_registered = False
+        self.dropped_alerts = 0
+        
         # Validate configuration
         if self.enabled and not all([self.sender_email, self.sender_password, self.admin_email]):
             print("⚠️ Warning: Email notifications enabled but credentials not configured properly")
@@ -48,18 +188,15 @@ class EmailNotifier:
         
         try:
             # Only send notification for high-risk detections
-            if prediction_result['confidence'] < 0.6:
+            if prediction_result['confidence'] < self.ALERT_CONFIDENCE_THRESHOLD:
                 print(f"ℹ️ Skipping notification - confidence too low ({prediction_result['confidence']*100:.1f}%)")
                 return False
             
             # Create email message
             message = self._create_alert_message(email_data, prediction_result)
             
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.sender_email, self.sender_password)
-                server.send_message(message)
+            # Send email over the persistent connection
+            self._send(message)
             
             print(f"✅ Phishing alert sent to {self.admin_email}")
             return True
@@ -74,6 +211,153 @@ class EmailNotifier:
             print(f"❌ Failed to send notification: {str(e)}")
             return False
     
+    def queue_phishing_alert(self, email_data, prediction_result):
+        """
+        Queue a phishing alert for background delivery
+        
+        Unlike send_phishing_alert, this returns immediately; a background
+        thread sends queued alerts over the persistent SMTP connection.
+        
+        Args:
+            email_data (dict): The email data that was analyzed
+            prediction_result (dict): The prediction result from the detector
+        
+        Returns:
+            bool: True if the alert was queued, False if skipped or dropped
+        """
+        if not self.should_alert(prediction_result):
+            return False
+        
+        # Build the message now so it records the detection time
+        message = self._create_alert_message(email_data, prediction_result)
+        
+        # Queued under the lock so close() never misses a late alert
+        with self._sender_lock:
+            if not self._accepting_alerts:
+                reason = "Notifier is closing"
+            else:
+                self._ensure_sender_thread()
+                try:
+                    self._alert_queue.put_nowait(message)
+                    return True
+                except queue.Full:
+                    reason = "Alert queue full"
+            self.dropped_alerts += 1
+        print(f"⚠️ {reason} - dropping phishing alert")
+        return False
+    
+    def _ensure_sender_thread(self):
+        """Start the background sender thread if it is not running (caller holds the lock)"""
+        if not self._close_registered:
+            # Flush the queue when the process (or gunicorn worker) exits
+            atexit.register(self.close)
+            self._close_registered = True
+        if self._sender_thread is None or not self._sender_thread.is_alive():
+            self._sender_thread = threading.Thread(
+                target=self._sender_loop, name='phishing-alert-sender', daemon=True
+            )
+            self._sender_thread.start()
+    
+    def _sender_loop(self):
+        """Send queued alert messages one after another, forever"""
+        while True:
+            message = self._alert_queue.get()
+            try:
+                self._send(message)
+                print(f"✅ Phishing alert sent to {self.admin_email}")
+            except Exception as e:
+                print(f"❌ Failed to send queued notification: {str(e)}")
+            finally:
+                self._alert_queue.task_done()
+    
+    def _send(self, message):
+        """Send a message over the shared SMTP connection"""
+        with self._smtp_lock:
+            try:
+                self._get_connection().send_message(message)
+            except (smtplib.SMTPException, OSError):
+                # Never reuse a connection in an unknown state
+                self._discard_connection()
+                raise
+            self._smtp_messages += 1
+    
+    def _get_connection(self):
+        """Return a live, logged-in SMTP connection (caller holds the lock)"""
+        if self._smtp is not None and self._smtp_messages >= self.MAX_MESSAGES_PER_CONNECTION:
+            self._discard_connection()
+        
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self._discard_connection()
+            except (smtplib.SMTPException, OSError):
+                self._discard_connection()
+        
+        if self._smtp is None:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+            try:
+                server.starttls(context=self.tls_context)
+                server.login(self.sender_email, self.sender_password)
+            except Exception:
+                server.close()
+                raise
+            self._smtp = server
+            self._smtp_messages = 0
+        
+        return self._smtp
+    
+    def _discard_connection(self):
+        """Close the shared SMTP connection, ignoring errors"""
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+    
+    def close(self, timeout=None):
+        """
+        Stop taking alerts, send the queued ones, then close the SMTP connection
+        
+        Registered with atexit once alerts are queued. Alerts still queued
+        after the timeout are dropped and counted in dropped_alerts.
+        
+        Args:
+            timeout: Seconds to wait for the queue (defaults to SHUTDOWN_TIMEOUT)
+        """
+        if timeout is None:
+            timeout = self.SHUTDOWN_TIMEOUT
+        deadline = time.monotonic() + timeout
+        
+        with self._sender_lock:
+            self._accepting_alerts = False
+        
+        # Queue.join() cannot time out, so wait on its condition directly
+        alert_queue = self._alert_queue
+        with alert_queue.all_tasks_done:
+            while alert_queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                alert_queue.all_tasks_done.wait(remaining)
+            unsent = alert_queue.unfinished_tasks
+        
+        if unsent:
+            with self._sender_lock:
+                self.dropped_alerts += unsent
+            print(f"⚠️ Dropping {unsent} unsent phishing alert(s) at shutdown")
+        
+        # A send still stuck past the deadline keeps the lock; leave it be
+        if self._smtp_lock.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            try:
+                if self._smtp is not None:
+                    self._discard_connection()
+            finally:
+                self._smtp_lock.release()
+    
+    def should_alert(self, prediction_result):
+        """Check whether a prediction would trigger a phishing alert"""
+        return self.enabled and prediction_result['confidence'] >= self.ALERT_CONFIDENCE_THRESHOLD
+    
     def _create_alert_message(self, email_data, prediction_result):
         """Create the alert email message"""
         message = MIMEMultipart("alternative")
@@ -98,120 +382,33 @@ class EmailNotifier:
     
     def _create_text_content(self, email_data, prediction_result):
         """Create plain text email content"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        text = f"""
-PHISHING EMAIL DETECTED
-========================
-
-Detection Time: {timestamp}
-Risk Level: {prediction_result['risk_level']}
-Confidence: {prediction_result['confidence']*100:.2f}%
-
-EMAIL DETAILS:
---------------
-From: {email_data.get('sender', 'N/A')}
-Subject: {email_data.get('subject', 'N/A')}
-
-Body Preview:
-{email_data.get('body', 'N/A')[:200]}...
-
-RECOMMENDATION:
-{self._get_recommendation(prediction_result)}
-
----
-This is an automated alert from the Email Phishing Detection System.
-"""
-        return text
+        return TEXT_TEMPLATE.format_map({
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'risk_level': prediction_result['risk_level'],
+            'confidence': prediction_result['confidence'] * 100,
+            'sender': email_data.get('sender', 'N/A'),
+            'subject': email_data.get('subject', 'N/A'),
+            'body_preview': email_data.get('body', 'N/A')[:200],
+            'recommendation': self._get_recommendation(prediction_result)
+        })
     
     def _create_html_content(self, email_data, prediction_result):
         """Create HTML email content"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Color based on risk level
-        risk_colors = {
-            'CRITICAL': '#dc3545',
-            'HIGH': '#fd7e14',
-            'MEDIUM': '#ffc107',
-            'LOW': '#0dcaf0',
-            'SAFE': '#28a745'
-        }
-        risk_color = risk_colors.get(prediction_result['risk_level'], '#6c757d')
-        
-        html = f"""
-        <html>
-          <head>
-            <style>
-              body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-              .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-              .header {{ background-color: {risk_color}; color: white; padding: 20px; border-radius: 5px 5px 0 0; }}
-              .content {{ background-color: #f8f9fa; padding: 20px; border: 1px solid #dee2e6; }}
-              .detail-row {{ margin: 10px 0; }}
-              .label {{ font-weight: bold; color: #495057; }}
-              .value {{ color: #212529; }}
-              .footer {{ background-color: #e9ecef; padding: 10px; text-align: center; font-size: 12px; color: #6c757d; border-radius: 0 0 5px 5px; }}
-              .risk-badge {{ display: inline-block; padding: 5px 10px; background-color: {risk_color}; color: white; border-radius: 3px; font-weight: bold; }}
-              .email-preview {{ background-color: white; padding: 15px; margin: 10px 0; border-left: 4px solid {risk_color}; }}
-            </style>
-          </head>
-          <body>
-            <div class="container">
-              <div class="header">
-                <h2>🚨 PHISHING EMAIL DETECTED</h2>
-              </div>
-              <div class="content">
-                <div class="detail-row">
-                  <span class="label">Detection Time:</span>
-                  <span class="value">{timestamp}</span>
-                </div>
-                <div class="detail-row">
-                  <span class="label">Risk Level:</span>
-                  <span class="risk-badge">{prediction_result['risk_level']}</span>
-                </div>
-                <div class="detail-row">
-                  <span class="label">Confidence:</span>
-                  <span class="value">{prediction_result['confidence']*100:.2f}%</span>
-                </div>
-                
-                <h3>Email Details</h3>
-                <div class="detail-row">
-                  <span class="label">From:</span>
-                  <span class="value">{email_data.get('sender', 'N/A')}</span>
-                </div>
-                <div class="detail-row">
-                  <span class="label">Subject:</span>
-                  <span class="value">{email_data.get('subject', 'N/A')}</span>
-                </div>
-                
-                <h3>Body Preview</h3>
-                <div class="email-preview">
-                  {email_data.get('body', 'N/A')[:300]}...
-                </div>
-                
-                <h3>Recommendation</h3>
-                <div class="email-preview">
-                  {self._get_recommendation(prediction_result)}
-                </div>
-              </div>
-              <div class="footer">
-                This is an automated alert from the Email Phishing Detection System
-              </div>
-            </div>
-          </body>
-        </html>
-        """
-        return html
+        # User-controlled fields are escaped so they can't inject markup
+        return HTML_TEMPLATE.format_map({
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'risk_color': RISK_COLORS.get(prediction_result['risk_level'], '#6c757d'),
+            'risk_level': html.escape(prediction_result['risk_level']),
+            'confidence': prediction_result['confidence'] * 100,
+            'sender': html.escape(email_data.get('sender', 'N/A')),
+            'subject': html.escape(email_data.get('subject', 'N/A')),
+            'body_preview': html.escape(email_data.get('body', 'N/A')[:300]),
+            'recommendation': self._get_recommendation(prediction_result)
+        })
     
     def _get_recommendation(self, prediction_result):
         """Get recommendation based on risk level"""
-        recommendations = {
-            'CRITICAL': "⛔ IMMEDIATE ACTION REQUIRED: Delete this email immediately and report it to your security team. Do not click any links or download attachments.",
-            'HIGH': "⚠️ HIGH RISK: This email is highly suspicious. Verify the sender through an alternative communication channel before taking any action.",
-            'MEDIUM': "⚡ CAUTION ADVISED: Exercise extreme caution with this email. Verify all information before clicking links or providing any data.",
-            'LOW': "✓ LOW RISK: While the risk is low, remain vigilant and verify sender authenticity before taking action.",
-            'SAFE': "✅ This email appears safe, but always practice good email security habits."
-        }
-        return recommendations.get(prediction_result['risk_level'], "Review this email carefully.")
+        return RECOMMENDATIONS.get(prediction_result['risk_level'], "Review this email carefully.")
     
     def test_connection(self):
         """Test email configuration and connection"""
@@ -229,7 +426,7 @@ This is an automated alert from the Email Phishing Detection System.
         
         try:
             with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
+                server.starttls(context=self.tls_context)
                 server.login(self.sender_email, self.sender_password)
             
             return {
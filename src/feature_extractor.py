@@ -4,27 +4,129 @@ Extracts various features from email content and metadata
 """
 
 import re
+import hashlib
+import threading
+from collections import OrderedDict
+import ahocorasick
+import numpy as np
+from joblib import Parallel, delayed
 import tldextract
-from urllib.parse import urlparse
 from email_validator import validate_email, EmailNotValidError
 from bs4 import BeautifulSoup
 import string
 
+from src._fast import char_stats as _compiled_char_stats
+
+
+# Names of the extracted features, in the column order models are trained on
+FEATURE_NAMES = (
+    'subject_length', 'body_length', 'num_words',
+    'sender_valid', 'sender_has_numbers', 'sender_domain_length',
+    'subject_has_urgent', 'subject_all_caps', 'subject_exclamation',
+    'num_urls', 'num_suspicious_keywords', 'has_ip_address',
+    'num_dots_in_url', 'num_external_links',
+    'special_char_ratio', 'digit_ratio', 'uppercase_ratio',
+    'has_form', 'has_javascript', 'mismatched_url', 'shortened_url',
+    'urgency_score',
+)
+
+
+# Precompiled patterns used during feature extraction
+_URL_RE = re.compile(r'https?://[^\s<>"\']+')
+_HOST_RE = re.compile(r'https?://([^/?#\s]*)', re.IGNORECASE)
+_IP_RE = re.compile(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b')
+_LINK_RE = re.compile(r'<a\s+href=["\']([^"\']+)["\'][^>]*>([^<]+)</a>', re.IGNORECASE)
+_DIGIT_RE = re.compile(r'\d')
+# The lookahead rejects a bad domain before the dot split can backtrack,
+# keeping the match linear in the length of the sender. \Z rather than $,
+# which would also accept a trailing newline; used with fullmatch
+_EMAIL_RE = re.compile(r'[^@\s]+@(?=[^@\s]*\Z)[^@\s]+\.[^@\s]+')
+
+# URL shortening services; subdomains of these count as well
+_SHORTENERS = (
+    'bit.ly', 'tinyurl.com', 'goo.gl', 't.co', 'ow.ly',
+    'short.link', 'tiny.cc', 'is.gd', 'buff.ly',
+)
+_SHORTENER_SUFFIXES = tuple('.' + shortener for shortener in _SHORTENERS)
+
+# Class of every byte value: 0 other, 1 punctuation, 2 digit, 3 uppercase
+_CHAR_CLASS = np.zeros(256, dtype=np.intp)
+_CHAR_CLASS[np.frombuffer(string.punctuation.encode(), dtype=np.uint8)] = 1
+_CHAR_CLASS[ord('0'):ord('9') + 1] = 2
+_CHAR_CLASS[ord('A'):ord('Z') + 1] = 3
+
+
+def _build_automaton(words):
+    """Build an Aho-Corasick automaton that reports each matched word"""
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+
+def _url_host(url):
+    """Return the host (netloc) part of an http(s) URL, or '' for other URLs"""
+    match = _HOST_RE.match(url)
+    return match.group(1) if match else ''
+
+
+def _email_digest(email_data):
+    """128-bit digest of the email fields that features are computed from"""
+    urls = email_data.get('urls') or ()
+    fields = [
+        email_data.get('subject', ''),
+        email_data.get('body', ''),
+        email_data.get('sender', ''),
+        *urls,
+    ]
+    # Fields may contain any character, including NUL, so prefix the URL
+    # count and each field's byte length to keep every encoding distinct
+    digest = hashlib.blake2b(len(urls).to_bytes(8, 'little'), digest_size=16)
+    for field in fields:
+        data = field.encode('utf-8', 'surrogatepass')
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.digest()
+
+
+def _text_bytes(text):
+    """View text as a uint8 array of its UTF-8 bytes"""
+    return np.frombuffer(text.encode('utf-8', 'surrogatepass'), dtype=np.uint8)
+
 
 class EmailFeatureExtractor:
     """Extract features from email for phishing detection"""
     
     # Common phishing keywords
-    PHISHING_KEYWORDS = [
+    PHISHING_KEYWORDS = (
         'urgent', 'verify', 'confirm', 'suspend', 'restricted', 'update',
         'click here', 'login', 'account', 'password', 'credit card', 'bank',
         'security', 'alert', 'winner', 'prize', 'congratulations', 'claim',
         'verify your account', 'suspended', 'locked', 'unusual activity',
         'confirm your identity', 'gift card', 'refund', 'tax', 'inheritance'
-    ]
+    )
+    
+    # Urgent language; each distinct word found adds 2 to the urgency score
+    URGENCY_WORDS = (
+        'urgent', 'immediate', 'act now', 'expires', 'limited time',
+        'hurry', 'quickly', 'don\'t wait', 'last chance', 'expire'
+    )
+    
+    # Emails whose feature values are remembered; 0 disables the cache
+    FEATURE_CACHE_SIZE = 10000
     
     def __init__(self):
         self.features = {}
+        
+        # Multi-pattern matchers: one pass over the text finds every word
+        self._keyword_automaton = _build_automaton(self.PHISHING_KEYWORDS)
+        self._urgency_automaton = _build_automaton(self.URGENCY_WORDS)
+        
+        # LRU cache of feature values keyed by a digest of the email, so
+        # the same campaign sent to many recipients is only extracted once
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
     
     def extract_features(self, email_data):
         """
@@ -40,11 +142,108 @@ class EmailFeatureExtractor:
         Returns:
             dict: Dictionary of extracted features
         """
+        return dict(zip(FEATURE_NAMES, self._extract_values(email_data)))
+    
+    def extract_feature_vector(self, email_data):
+        """
+        Extract features as a float32 vector ready for the model
+        
+        Args:
+            email_data (dict): Same fields as extract_features()
+        
+        Returns:
+            np.ndarray: Feature values ordered as FEATURE_NAMES
+        """
+        return np.array(self._extract_values(email_data), dtype=np.float32)
+    
+    def extract_features_batch(self, emails, n_jobs=1, count=None):
+        """
+        Extract features for many emails into one preallocated matrix
+        
+        Args:
+            emails: List of email dicts with the same fields as
+                    extract_features(), or any iterable of them when
+                    count is given (e.g. a generator streaming a dataset)
+            n_jobs (int): Worker threads to extract with (-1 for one per CPU);
+                          lxml parsing and the numba kernel release the GIL
+            count (int): Number of emails, if emails has no len()
+        
+        Returns:
+            tuple: (float32 array of shape n_emails x n_features, FEATURE_NAMES)
+        """
+        if count is None:
+            count = len(emails)
+        
+        if n_jobs == 1:
+            rows = map(self._extract_values, emails)
+        else:
+            rows = Parallel(n_jobs=n_jobs, prefer='threads', return_as='generator')(
+                delayed(self._extract_values)(email_data) for email_data in emails
+            )
+        
+        X = np.empty((count, len(FEATURE_NAMES)), dtype=np.float32)
+        n_rows = 0
+        for values in rows:
+            if n_rows == count:
+                raise ValueError(f"Got more than the expected {count} emails")
+            X[n_rows] = values
+            n_rows += 1
+        if n_rows != count:
+            raise ValueError(f"Expected {count} emails, got {n_rows}")
+        return X, FEATURE_NAMES
+    
+    def _extract_values(self, email_data):
+        """Feature values for an email, served from the cache when seen before"""
+        if not self.FEATURE_CACHE_SIZE:
+            return self._compute_values(email_data)
+        
+        key = _email_digest(email_data)
+        with self._cache_lock:
+            values = self._cache.get(key)
+            if values is not None:
+                self._cache.move_to_end(key)
+                return values
+        
+        values = self._compute_values(email_data)
+        with self._cache_lock:
+            self._cache[key] = values
+            if len(self._cache) > self.FEATURE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return values
+    
+    def _compute_values(self, email_data):
+        """Compute every feature value as a tuple ordered as FEATURE_NAMES"""
         subject = email_data.get('subject', '')
         body = email_data.get('body', '')
         sender = email_data.get('sender', '')
         urls = email_data.get('urls', [])
         
+        subject_lower = subject.lower()
+        sender_values = (
+            self._is_valid_email(sender),
+            int(bool(_DIGIT_RE.search(sender))),
+            len(sender.split('@')[1]) if '@' in sender else 0,
+        )
+        subject_values = (
+            int('urgent' in subject_lower),
+            int(subject.isupper() and len(subject) > 3),
+            subject.count('!'),
+        )
+        
+        # Bodiless emails (bounces, pings): every body and URL feature is 0,
+        # so skip HTML cleaning and the URL and character scans
+        if not body and not urls:
+            combined_lower = subject_lower + ' '
+            return (
+                len(subject), 0, 0,
+                *sender_values,
+                *subject_values,
+                0, self._count_phishing_keywords(combined_lower), 0, 0, 0,
+                0, 0, 0,
+                0, 0, 0, 0,
+                self._calculate_urgency_score(combined_lower),
+            )
+        
         # Extract text from HTML if necessary
         clean_body = self._clean_html(body)
         
@@ -52,77 +251,86 @@ class EmailFeatureExtractor:
         if not urls:
             urls = self._extract_urls(clean_body)
         
-        features = {
+        special_chars, digits, uppercase, text_length = self._char_stats(clean_body)
+        
+        # Lowercase each text once and share it between the checks below
+        combined_lower = subject_lower + ' ' + clean_body.lower()
+        raw_lower = body.lower() if '<' in body else ''
+        
+        num_urls = len(urls)
+        
+        return (
             # Email length features
-            'subject_length': len(subject),
-            'body_length': len(clean_body),
-            'num_words': len(clean_body.split()),
-            
-            # Sender features
-            'sender_valid': self._is_valid_email(sender),
-            'sender_has_numbers': int(bool(re.search(r'\d', sender))),
-            'sender_domain_length': len(sender.split('@')[1]) if '@' in sender else 0,
+            len(subject),
+            len(clean_body),
+            len(clean_body.split()),
             
-            # Subject features
-            'subject_has_urgent': int('urgent' in subject.lower()),
-            'subject_all_caps': int(subject.isupper() and len(subject) > 3),
-            'subject_exclamation': subject.count('!'),
+            # Sender and subject features
+            *sender_values,
+            *subject_values,
             
             # Content features
-            'num_urls': len(urls),
-            'num_suspicious_keywords': self._count_phishing_keywords(subject + ' ' + clean_body),
-            'has_ip_address': int(self._has_ip_address(urls)),
-            'num_dots_in_url': self._count_dots_in_urls(urls),
-            'num_external_links': len(urls),
+            num_urls,
+            self._count_phishing_keywords(combined_lower),
+            int(self._has_ip_address(urls)),
+            self._count_dots_in_urls(urls),
+            num_urls,  # num_external_links
             
             # Character analysis
-            'special_char_ratio': self._special_char_ratio(clean_body),
-            'digit_ratio': self._digit_ratio(clean_body),
-            'uppercase_ratio': self._uppercase_ratio(clean_body),
+            special_chars / text_length if text_length else 0,
+            digits / text_length if text_length else 0,
+            uppercase / text_length if text_length else 0,
             
             # Suspicious patterns
-            'has_form': int('<form' in body.lower()),
-            'has_javascript': int('<script' in body.lower()),
-            'mismatched_url': self._check_mismatched_urls(body, urls),
-            'shortened_url': int(any(self._is_shortened_url(url) for url in urls)),
+            int('<form' in raw_lower),
+            int('<script' in raw_lower),
+            self._check_mismatched_urls(body, urls),
+            int(any(self._is_shortened_url(url) for url in urls)),
             
             # Urgency indicators
-            'urgency_score': self._calculate_urgency_score(subject + ' ' + clean_body),
-        }
-        
-        return features
+            self._calculate_urgency_score(combined_lower),
+        )
     
     def _clean_html(self, text):
         """Remove HTML tags and return clean text"""
-        if '<html' in text.lower() or '<body' in text.lower():
-            soup = BeautifulSoup(text, 'html.parser')
+        # Plain-text bodies have no tags at all; skip lowercasing and parsing
+        if '<' not in text:
+            return text
+        text_lower = text.lower()
+        if '<html' in text_lower or '<body' in text_lower:
+            soup = BeautifulSoup(text, 'lxml')
             return soup.get_text(separator=' ', strip=True)
         return text
     
     def _extract_urls(self, text):
         """Extract URLs from text"""
-        url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-        return re.findall(url_pattern, text)
+        return _URL_RE.findall(text)
     
-    def _is_valid_email(self, email):
-        """Check if email address is valid"""
+    def _is_valid_email(self, email, strict=False):
+        """
+        Check if email address is valid
+        
+        A syntax check with a precompiled regex is enough for the feature;
+        strict=True runs the full email_validator syntax check instead
+        (without DNS deliverability lookups).
+        """
+        if not strict:
+            return int(bool(_EMAIL_RE.fullmatch(email)))
         try:
-            validate_email(email)
+            validate_email(email, check_deliverability=False)
             return 1
         except EmailNotValidError:
             return 0
     
-    def _count_phishing_keywords(self, text):
-        """Count phishing-related keywords"""
-        text_lower = text.lower()
-        count = sum(1 for keyword in self.PHISHING_KEYWORDS if keyword in text_lower)
-        return count
+    def _count_phishing_keywords(self, text_lower):
+        """Count phishing-related keywords in already-lowercased text"""
+        found = {keyword for _, keyword in self._keyword_automaton.iter(text_lower)}
+        return len(found)
     
     def _has_ip_address(self, urls):
         """Check if any URL contains an IP address instead of domain"""
-        ip_pattern = r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b'
         for url in urls:
-            if re.search(ip_pattern, url):
+            if _IP_RE.search(url):
                 return True
         return False
     
@@ -130,40 +338,41 @@ class EmailFeatureExtractor:
         """Count total dots in all URLs (subdomains can be suspicious)"""
         total_dots = 0
         for url in urls:
-            try:
-                parsed = urlparse(url)
-                domain = parsed.netloc
-                total_dots += domain.count('.')
-            except:
-                pass
+            host = _url_host(url)
+            total_dots += host.count('.')
         return total_dots
     
-    def _special_char_ratio(self, text):
-        """Calculate ratio of special characters"""
-        if len(text) == 0:
-            return 0
-        special_chars = sum(1 for c in text if c in string.punctuation)
-        return special_chars / len(text)
-    
-    def _digit_ratio(self, text):
-        """Calculate ratio of digits"""
-        if len(text) == 0:
-            return 0
-        digits = sum(1 for c in text if c.isdigit())
-        return digits / len(text)
-    
-    def _uppercase_ratio(self, text):
-        """Calculate ratio of uppercase letters"""
-        if len(text) == 0:
-            return 0
-        uppercase = sum(1 for c in text if c.isupper())
-        return uppercase / len(text)
+    def _char_stats(self, text):
+        """
+        Count special, digit and uppercase characters in one pass
+        
+        Returns:
+            tuple: (special, digits, uppercase, length)
+        """
+        if _compiled_char_stats is not None:
+            # numba kernel: a single loop with no temporary arrays
+            special, digits, uppercase = _compiled_char_stats(_text_bytes(text))
+        else:
+            # Punctuation, digit and uppercase byte classes are disjoint, so one
+            # bincount over the class of every byte yields all three counts
+            counts = np.bincount(_CHAR_CLASS[_text_bytes(text)], minlength=4)
+            special, digits, uppercase = int(counts[1]), int(counts[2]), int(counts[3])
+        
+        # str.isdigit/isupper also match non-ASCII characters
+        if not text.isascii():
+            digits = uppercase = 0
+            for c in text:
+                if c.isdigit():
+                    digits += 1
+                elif c.isupper():
+                    uppercase += 1
+        
+        return special, digits, uppercase, len(text)
     
     def _check_mismatched_urls(self, body, urls):
         """Check if displayed text doesn't match actual URL"""
         # Look for <a href="url">different text</a> patterns
-        link_pattern = r'<a\s+href=["\']([^"\']+)["\'][^>]*>([^<]+)</a>'
-        matches = re.findall(link_pattern, body, re.IGNORECASE)
+        matches = _LINK_RE.findall(body)
         
         mismatched = 0
         for href, text in matches:
@@ -175,20 +384,11 @@ class EmailFeatureExtractor:
     
     def _is_shortened_url(self, url):
         """Check if URL is from a URL shortening service"""
-        shorteners = ['bit.ly', 'tinyurl.com', 'goo.gl', 't.co', 'ow.ly', 
-                     'short.link', 'tiny.cc', 'is.gd', 'buff.ly']
-        
-        try:
-            parsed = urlparse(url)
-            domain = parsed.netloc.lower()
-            return any(shortener in domain for shortener in shorteners)
-        except:
-            return False
-    
-    def _calculate_urgency_score(self, text):
-        """Calculate urgency score based on urgent language"""
-        urgency_words = ['urgent', 'immediate', 'act now', 'expires', 'limited time',
-                        'hurry', 'quickly', 'don\'t wait', 'last chance', 'expire']
-        text_lower = text.lower()
-        score = sum(2 if word in text_lower else 0 for word in urgency_words)
-        return min(score, 10)  # Cap at 10
+        # Drop any userinfo and port so only the hostname is compared
+        domain = _url_host(url).rpartition('@')[2].partition(':')[0].lower()
+        return domain in _SHORTENERS or domain.endswith(_SHORTENER_SUFFIXES)
+    
+    def _calculate_urgency_score(self, text_lower):
+        """Calculate urgency score based on urgent language in already-lowercased text"""
+        found = {word for _, word in self._urgency_automaton.iter(text_lower)}
+        return min(2 * len(found), 10)  # Cap at 10
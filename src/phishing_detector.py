@@ -5,36 +5,125 @@ Trains and uses ML model to detect phishing emails
 
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.inspection import permutation_importance
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 import joblib
 import os
+from itertools import islice
+
+from src._fast import predict_forest as _compiled_predict_forest
+
+try:
+    import onnxruntime
+except ImportError:  # ONNX Runtime is an optional inference backend
+    onnxruntime = None
+
+try:
+    import tl2cgen
+except ImportError:  # Compiled tree libraries are an optional inference backend
+    tl2cgen = None
+
+
+# Lower probability bound of each risk level above SAFE
+RISK_THRESHOLDS = np.array([0.2, 0.4, 0.6, 0.8])
+RISK_LEVELS = np.array(['SAFE', 'LOW', 'MEDIUM', 'HIGH', 'CRITICAL'])
+
+
+def _open_compiled_predictor(path):
+    """
+    Load a compiled tree library
+    
+    TL2CGEN_NUM_THREADS sizes its thread pool; tl2cgen uses every core
+    when it is unset.
+    """
+    nthread = os.getenv('TL2CGEN_NUM_THREADS')
+    return tl2cgen.Predictor(path, nthread=int(nthread) if nthread else None)
+
+
+# Supported classifiers, with the name reported by the API
+MODEL_TYPES = {
+    'random_forest': 'Random Forest Classifier',
+    'hist_gradient_boosting': 'Histogram Gradient Boosting Classifier',
+}
 
 
 class PhishingDetector:
     """Machine Learning model for phishing email detection"""
     
-    def __init__(self, model_path='models/phishing_detector.pkl'):
+    # Trees kept after training; predict time grows linearly with tree count
+    N_PRUNED_ESTIMATORS = 50
+    
+    # Deepest level any tree may be walked to at predict time. Below the
+    # forest's fit depth of 8, so the last splits of deep trees are folded
+    # into their parent's class distribution and every walk is shorter
+    INFERENCE_MAX_DEPTH = 6
+    
+    # Smallest batch scored by the compiled tree library; below this its
+    # per-call overhead outweighs the faster tree walks
+    COMPILED_MIN_BATCH = 16
+    
+    def __init__(self, model_path='models/phishing_detector.pkl', threshold=0.5,
+                 model_type='random_forest'):
         self.model_path = model_path
+        self.threshold = threshold  # Phishing probability at which an email is flagged
+        self.model_type = model_type  # Replaced by the saved model's type on load
         self.model = None
         self.feature_names = None
+        self._feature_order = None  # feature_names as a tuple, for fast lookups
+        self.onnx_session = None
+        self.compiled_predictor = None  # tl2cgen build of the trees, see export_compiled
+        self.flat_forest = None  # Structure-of-arrays copy of the trees, see compile_flat_forest
+        self.n_features = None
+        self.top_features = None  # 10 most important features, cached per model
+        self.permutation_importances = None  # For models without feature_importances_
         
         # Load model if it exists
         if os.path.exists(model_path):
             self.load_model()
+        else:
+            self.reset_model(model_type)
+    
+    def reset_model(self, model_type=None):
+        """
+        Replace the model with a new, untrained one
+        
+        Args:
+            model_type: A key of MODEL_TYPES (defaults to the current type)
+        """
+        if model_type is None:
+            model_type = self.model_type
+        if model_type not in MODEL_TYPES:
+            raise ValueError(f"Unknown model type: {model_type}")
+        
+        if model_type == 'hist_gradient_boosting':
+            # Fewer, shallower trees over binned features
+            self.model = HistGradientBoostingClassifier(
+                max_iter=100,
+                max_depth=6,
+                learning_rate=0.1,
+                random_state=42
+            )
         else:
             # Initialize new Random Forest model
             self.model = RandomForestClassifier(
                 n_estimators=100,
-                max_depth=20,
+                max_depth=8,
                 min_samples_split=5,
                 min_samples_leaf=2,
                 random_state=42,
                 n_jobs=-1
             )
+        self.model_type = model_type
+        self.onnx_session = None
+        self.compiled_predictor = None
+        self.flat_forest = None
+        self.permutation_importances = None
+        self.n_features = None
+        self.top_features = None
     
-    def train(self, X, y, test_size=0.2):
+    def train(self, X, y, test_size=0.2, feature_names=None):
         """
         Train the phishing detection model
         
@@ -42,6 +131,8 @@ class PhishingDetector:
             X: Feature matrix (DataFrame or array)
             y: Labels (0 = legitimate, 1 = phishing)
             test_size: Proportion of data for testing
+            feature_names: Column names of an array X (taken from a
+                           DataFrame's columns otherwise)
         
         Returns:
             dict: Training metrics
@@ -52,8 +143,10 @@ class PhishingDetector:
         
         # Store feature names
         if isinstance(X, pd.DataFrame):
-            self.feature_names = X.columns.tolist()
+            self._set_feature_names(X.columns.tolist())
             X = X.values
+        elif feature_names is not None:
+            self._set_feature_names(list(feature_names))
         
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(
@@ -63,6 +156,19 @@ class PhishingDetector:
         # Train model
         print("Training phishing detection model...")
         self.model.fit(X_train, y_train)
+        self.onnx_session = None  # Any exported ONNX graph is now stale
+        self.compiled_predictor = None
+        self.flat_forest = None
+        self.prune_estimators(X_train, y_train, self.N_PRUNED_ESTIMATORS)
+        self.prune_for_inference()
+        self.permutation_importances = None
+        if not hasattr(self.model, 'feature_importances_'):
+            # Gradient boosting has no impurity importances; measure instead
+            # how much shuffling each feature hurts held-out accuracy
+            self.permutation_importances = permutation_importance(
+                self.model, X_test, y_test, n_repeats=5, random_state=42, n_jobs=-1
+            ).importances_mean
+        self._cache_feature_summary()
         
         # Evaluate
         y_pred = self.model.predict(X_test)
@@ -79,12 +185,153 @@ class PhishingDetector:
         
         return metrics
     
-    def predict(self, features):
+    def prune_estimators(self, X, y, n_keep):
+        """
+        Keep only the n_keep trees with the best out-of-bag accuracy
+        
+        Args:
+            X: Feature matrix the forest was fitted on
+            y: Labels the forest was fitted on
+            n_keep: Number of trees to keep
+        """
+        if not hasattr(self.model, 'estimators_') or n_keep >= len(self.model.estimators_):
+            return
+        
+        X = np.asarray(X)
+        y = np.asarray(y)
+        scores = []
+        for estimator, samples in zip(self.model.estimators_, self.model.estimators_samples_):
+            oob_mask = np.ones(len(y), dtype=bool)
+            oob_mask[samples] = False
+            if not oob_mask.any():
+                scores.append(0.0)
+                continue
+            # Trees predict encoded class indices
+            predicted = self.model.classes_.take(
+                estimator.predict(X[oob_mask]).astype(int)
+            )
+            scores.append(np.mean(predicted == y[oob_mask]))
+        
+        # Stable sort keeps the original tree order among equal scores
+        keep = np.sort(np.argsort(scores, kind='stable')[::-1][:n_keep])
+        self.model.estimators_ = [self.model.estimators_[i] for i in keep]
+        self.model.n_estimators = len(self.model.estimators_)
+        # Flat and exported copies still hold the dropped trees
+        self.onnx_session = None
+        self.compiled_predictor = None
+        self.flat_forest = None
+        self._cache_feature_summary()
+        print(f"Pruned forest to {self.model.n_estimators} trees")
+    
+    def prune_for_inference(self, max_depth=None):
+        """
+        Cut every tree at max_depth so no prediction walks deeper
+        
+        Nodes at max_depth become leaves. An internal node already stores
+        the class distribution of the training samples that reach it, so
+        the new leaf predicts the aggregate of the subtree it replaces.
+        
+        Forests only; gradient boosting trees are already grown to their
+        own max_depth and are left unchanged.
+        
+        Args:
+            max_depth: Depth at which trees are cut (the root has depth 0;
+                       defaults to INFERENCE_MAX_DEPTH)
+        
+        Returns:
+            int: Number of nodes turned into leaves
+        """
+        if self.model is None:
+            raise ValueError("Model not trained or loaded.")
+        if not hasattr(self.model, 'estimators_'):
+            return 0
+        if max_depth is None:
+            max_depth = self.INFERENCE_MAX_DEPTH
+        
+        n_cut = sum(
+            self._cut_tree(estimator.tree_, max_depth)
+            for estimator in self.model.estimators_
+        )
+        
+        if n_cut:
+            # Any exported or flat copy still has the full trees
+            self.onnx_session = None
+            self.compiled_predictor = None
+            self.flat_forest = None
+            self._cache_feature_summary()
+        print(f"Cut {n_cut} subtrees deeper than {max_depth} levels")
+        return n_cut
+    
+    @staticmethod
+    def _cut_tree(tree, max_depth):
+        """
+        Rebuild a fitted sklearn tree without the nodes below max_depth
+        
+        The kept nodes are renumbered in sklearn's depth-first order, so the
+        dropped subtrees leave nothing behind for feature_importances_,
+        get_depth() or the ONNX/compiled exports to count.
+        
+        Returns:
+            int: Number of internal nodes turned into leaves
+        """
+        state = tree.__getstate__()
+        nodes = state['nodes']
+        left, right = nodes['left_child'], nodes['right_child']
+        
+        order = []  # Kept node ids, in their new order
+        cut = []
+        depth_reached = 0
+        stack = [(0, 0)]
+        while stack:
+            node, depth = stack.pop()
+            order.append(node)
+            depth_reached = max(depth_reached, depth)
+            if left[node] == -1:  # Already a leaf
+                continue
+            if depth >= max_depth:
+                cut.append(node)
+            else:
+                # Right pushed first so the left subtree is numbered first
+                stack.append((right[node], depth + 1))
+                stack.append((left[node], depth + 1))
+        
+        if not cut:
+            return 0
+        
+        order = np.array(order)
+        new_index = np.full(len(nodes), -1, dtype=np.intp)
+        new_index[order] = np.arange(len(order))
+        
+        new_nodes = nodes[order]
+        internal = new_nodes['left_child'] != -1
+        new_nodes['left_child'][internal] = new_index[new_nodes['left_child'][internal]]
+        new_nodes['right_child'][internal] = new_index[new_nodes['right_child'][internal]]
+        
+        # sklearn marks leaves with child -1 and feature/threshold -2; a cut
+        # node keeps its value, the class distribution of its whole subtree
+        cut_rows = new_index[cut]
+        new_nodes['left_child'][cut_rows] = -1
+        new_nodes['right_child'][cut_rows] = -1
+        new_nodes['feature'][cut_rows] = -2
+        new_nodes['threshold'][cut_rows] = -2.0
+        
+        state.update(
+            nodes=new_nodes,
+            values=state['values'][order],
+            node_count=len(order),
+            max_depth=depth_reached,
+        )
+        tree.__setstate__(state)
+        return len(cut)
+    
+    def predict(self, features, threshold=None):
         """
         Predict if an email is phishing
         
         Args:
             features: Dictionary or array of email features
+            threshold: Phishing probability at which the email is flagged
+                       (defaults to self.threshold)
         
         Returns:
             dict: Prediction results with probability
@@ -94,27 +341,192 @@ class PhishingDetector:
         
         # Convert features to array
         if isinstance(features, dict):
-            if self.feature_names:
+            if self._feature_order:
                 # Ensure features are in correct order
-                feature_array = np.array([[features.get(name, 0) for name in self.feature_names]])
+                feature_array = np.fromiter(
+                    (features.get(name, 0) for name in self._feature_order),
+                    dtype=np.float32, count=len(self._feature_order)
+                ).reshape(1, -1)
             else:
-                feature_array = np.array([list(features.values())])
+                feature_array = np.array([list(features.values())], dtype=np.float32)
         else:
-            feature_array = np.array([features])
+            feature_array = np.array([features], dtype=np.float32)
+        
+        if threshold is None:
+            threshold = self.threshold
         
-        # Make prediction
-        prediction = self.model.predict(feature_array)[0]
-        probability = self.model.predict_proba(feature_array)[0]
+        # One forest traversal; the label is derived from the probability
+        phishing_probability = float(self._predict_proba(feature_array)[0, 1])
+        is_phishing = phishing_probability >= threshold
         
         result = {
-            'is_phishing': bool(prediction),
-            'confidence': float(probability[1]),  # Probability of being phishing
-            'risk_level': self._get_risk_level(probability[1]),
-            'prediction': 'PHISHING' if prediction == 1 else 'LEGITIMATE'
+            'is_phishing': is_phishing,
+            'confidence': phishing_probability,  # Probability of being phishing
+            'risk_level': self._get_risk_level(phishing_probability),
+            'prediction': 'PHISHING' if is_phishing else 'LEGITIMATE'
         }
         
         return result
     
+    def predict_batch(self, X, threshold=None):
+        """
+        Predict many emails with a single model call
+        
+        Args:
+            X: List of feature dicts, or a 2-D array of email features
+               (n_emails x n_features) with columns in the same order
+               the model was trained with
+            threshold: Phishing probability at which an email is flagged
+                       (defaults to self.threshold)
+        
+        Returns:
+            list: Prediction result dicts, one per email
+        """
+        if self.model is None:
+            raise ValueError("Model not trained or loaded. Train model first.")
+        
+        if isinstance(X, (list, tuple)) and X and isinstance(X[0], dict):
+            X = self._features_to_matrix(X)
+        
+        X = np.asarray(X)
+        if X.ndim != 2:
+            raise ValueError("Expected a 2-D feature matrix.")
+        if X.shape[0] == 0:
+            return []
+        
+        if threshold is None:
+            threshold = self.threshold
+        
+        # One forest traversal for the whole batch
+        confidences = self._predict_proba(X)[:, 1]
+        predictions = confidences >= threshold
+        risk_levels = RISK_LEVELS[np.digitize(confidences, RISK_THRESHOLDS)]
+        
+        return [
+            {
+                'is_phishing': bool(prediction),
+                'confidence': float(confidence),
+                'risk_level': str(risk_level),
+                'prediction': 'PHISHING' if prediction else 'LEGITIMATE'
+            }
+            for prediction, confidence, risk_level
+            in zip(predictions, confidences, risk_levels)
+        ]
+    
+    def _features_to_matrix(self, features_list):
+        """Stack feature dicts into a float32 matrix ordered by feature_names"""
+        names = self._feature_order or tuple(features_list[0].keys())
+        matrix = np.empty((len(features_list), len(names)), dtype=np.float32)
+        for i, features in enumerate(features_list):
+            matrix[i] = [features.get(name, 0) for name in names]
+        return matrix
+    
+    def _predict_proba(self, X):
+        """
+        Class probabilities from the compiled tree library for larger
+        batches, else ONNX Runtime if available, then the flat forest
+        (numba or NumPy), else sklearn
+        """
+        # Trees compare features as float32, so convert once up front
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if self.compiled_predictor is not None and X.shape[0] >= self.COMPILED_MIN_BATCH:
+            # One probability row per email; the last column is PHISHING
+            phishing = self.compiled_predictor.predict(
+                tl2cgen.DMatrix(X)
+            ).reshape(X.shape[0], -1)[:, -1].astype(np.float64)
+            return np.column_stack((1.0 - phishing, phishing))
+        if self.onnx_session is not None:
+            return self.onnx_session.run(None, {'X': X})[1]
+        if hasattr(self.model, 'estimators_'):
+            return self.predict_flat(X)
+        return self.model.predict_proba(X)
+    
+    def compile_flat_forest(self):
+        """
+        Flatten every tree into shared structure-of-arrays for predict_flat
+        
+        Node arrays of all trees are concatenated, with child indices made
+        global, so a prediction walks a few contiguous arrays instead of
+        sklearn's per-tree objects.
+        """
+        if self.model is None or not hasattr(self.model, 'estimators_'):
+            raise ValueError("Model not trained or loaded.")
+        
+        trees = [estimator.tree_ for estimator in self.model.estimators_]
+        roots = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+        
+        def children(nodes, root):
+            # Leaves keep -1; internal nodes point at global node indices
+            return np.where(nodes >= 0, nodes + root, -1)
+        
+        self.flat_forest = {
+            'roots': roots.astype(np.int32),
+            'feature': np.concatenate([tree.feature for tree in trees]).astype(np.int32),
+            # float64 like sklearn, so float32 inputs split exactly as in the model
+            'threshold': np.concatenate([tree.threshold for tree in trees]),
+            'left': np.concatenate([
+                children(tree.children_left, root) for tree, root in zip(trees, roots)
+            ]).astype(np.int32),
+            'right': np.concatenate([
+                children(tree.children_right, root) for tree, root in zip(trees, roots)
+            ]).astype(np.int32),
+            # Phishing probability of each node (meaningful at the leaves)
+            'leaf_value': np.concatenate([
+                tree.value[:, 0, 1] / tree.value[:, 0, :].sum(axis=1) for tree in trees
+            ]),
+        }
+        return self.flat_forest
+    
+    def predict_flat(self, X):
+        """
+        Class probabilities from the flattened forest
+        
+        Same result as the model's predict_proba for a binary forest.
+        
+        Args:
+            X: 2-D array of email features (n_emails x n_features)
+        
+        Returns:
+            np.ndarray: (n_emails x 2) probabilities of LEGITIMATE, PHISHING
+        """
+        if self.flat_forest is None:
+            self.compile_flat_forest()
+        
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        flat = self.flat_forest
+        
+        if _compiled_predict_forest is not None:
+            phishing = _compiled_predict_forest(
+                X, flat['roots'], flat['feature'], flat['threshold'],
+                flat['left'], flat['right'], flat['leaf_value']
+            )
+            return np.column_stack((1.0 - phishing, phishing))
+        
+        # Without numba, walk all trees for all emails at once: each step moves
+        # every (tree, email) pair one level down with a single vectorized select
+        rows = np.arange(X.shape[0])
+        nodes = np.repeat(flat['roots'][:, np.newaxis], X.shape[0], axis=1)
+        features = flat['feature'][nodes]
+        active = features >= 0
+        while active.any():
+            # Pairs already at a leaf stay put; clamp their feature to a valid column
+            go_left = X[rows, np.maximum(features, 0)] <= flat['threshold'][nodes]
+            nodes = np.where(
+                active,
+                np.where(go_left, flat['left'][nodes], flat['right'][nodes]),
+                nodes
+            )
+            features = flat['feature'][nodes]
+            active = features >= 0
+        
+        # Sum tree by tree in order, exactly like the forest's predict_proba
+        phishing = np.zeros(X.shape[0])
+        for tree_values in flat['leaf_value'][nodes]:
+            phishing += tree_values
+        phishing /= len(flat['roots'])
+        
+        return np.column_stack((1.0 - phishing, phishing))
+    
     def _get_risk_level(self, phishing_probability):
         """Determine risk level based on probability"""
         if phishing_probability >= 0.8:
@@ -139,10 +551,32 @@ class PhishingDetector:
         # Save model and feature names
         model_data = {
             'model': self.model,
-            'feature_names': self.feature_names
+            'feature_names': self.feature_names,
+            'permutation_importances': self.permutation_importances
         }
-        joblib.dump(model_data, path)
+        # Stored uncompressed (pickle protocol 5) so load_model can memory-map
+        # the NumPy arrays; joblib cannot memory-map a compressed file
+        joblib.dump(model_data, path, compress=0, protocol=5)
         print(f"Model saved to {path}")
+        
+        # Write the ONNX export alongside so inference can skip sklearn
+        try:
+            self.export_onnx(self._onnx_path(path))
+        except ImportError:
+            print("ℹ️ skl2onnx not installed - skipping ONNX export")
+        except Exception as e:
+            # Not every skl2onnx release converts every model type; the
+            # pickle is saved and any older .onnx file is ignored as stale
+            print(f"⚠ ONNX export failed - skipping: {e.__class__.__name__}")
+        
+        # And a native library of the trees for large batches
+        try:
+            self.export_compiled(self._compiled_path(path))
+        except ImportError:
+            print("ℹ️ treelite/tl2cgen not installed - skipping compiled export")
+        except Exception as e:
+            # Building the library needs a C compiler (gcc)
+            print(f"⚠ Compiled export failed - skipping: {e.__class__.__name__}")
     
     def load_model(self, path=None):
         """Load trained model from disk"""
@@ -152,17 +586,187 @@ class PhishingDetector:
         if not os.path.exists(path):
             raise FileNotFoundError(f"Model file not found: {path}")
         
-        model_data = joblib.load(path)
+        # sklearn copies each tree's node arrays into its own buffers when
+        # unpickling, so only forest-level arrays stay mapped; across gunicorn
+        # workers the trees are shared copy-on-write through preload_app
+        model_data = joblib.load(path, mmap_mode='r')
         self.model = model_data['model']
-        self.feature_names = model_data.get('feature_names')
+        self.model_type = (
+            'hist_gradient_boosting'
+            if isinstance(self.model, HistGradientBoostingClassifier)
+            else 'random_forest'
+        )
+        self.permutation_importances = model_data.get('permutation_importances')
+        self.flat_forest = None
+        self._set_feature_names(model_data.get('feature_names'))
         print(f"Model loaded from {path}")
+        
+        self._cache_feature_summary()
+        self._load_onnx_session(path)
+        self._load_compiled_predictor(path)
+    
+    def check_feature_order(self, feature_names):
+        """
+        Make sure bare feature vectors in feature_names order fit the model
+        
+        predict and predict_batch take arrays as already being in the
+        model's column order, so a model trained on other columns, or the
+        same columns in another order, would score shuffled features.
+        
+        Raises:
+            ValueError: If the model was trained on a different column order
+        """
+        if self._feature_order and self._feature_order != tuple(feature_names):
+            raise ValueError(
+                "Model feature columns do not match the feature extractor's "
+                "FEATURE_NAMES order. Retrain with train_model.py."
+            )
+    
+    def _set_feature_names(self, feature_names):
+        """Store the model's feature column order"""
+        self.feature_names = feature_names
+        self._feature_order = tuple(feature_names) if feature_names else None
+    
+    def _cache_feature_summary(self):
+        """Cache feature count and top 10 features; fixed until the model changes"""
+        feature_importance = self.get_feature_importance()
+        self.n_features = len(feature_importance)
+        self.top_features = {
+            name: float(importance)
+            for name, importance in islice(feature_importance.items(), 10)
+        }
+    
+    def _onnx_path(self, path=None):
+        """Path of the ONNX export that sits next to the pickled model"""
+        if path is None:
+            path = self.model_path
+        return os.path.splitext(path)[0] + '.onnx'
+    
+    def export_onnx(self, path=None):
+        """
+        Export the trained model to ONNX for faster inference
+        
+        Requires the optional skl2onnx package.
+        
+        Args:
+            path: Output path (defaults to the model path with .onnx suffix)
+        
+        Returns:
+            str: Path of the written ONNX file
+        """
+        if self.model is None:
+            raise ValueError("Model not trained or loaded.")
+        
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import FloatTensorType
+        
+        if path is None:
+            path = self._onnx_path()
+        
+        initial_type = [('X', FloatTensorType([None, self.model.n_features_in_]))]
+        onx = convert_sklearn(
+            self.model,
+            initial_types=initial_type,
+            options={id(self.model): {'zipmap': False}}
+        )
+        
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(onx.SerializeToString())
+        print(f"ONNX model saved to {path}")
+        
+        if onnxruntime is not None:
+            self.onnx_session = onnxruntime.InferenceSession(
+                path, providers=['CPUExecutionProvider']
+            )
+        return path
+    
+    def _load_onnx_session(self, model_path):
+        """Use the ONNX export of a model if it exists and is up to date"""
+        self.onnx_session = None
+        if onnxruntime is None:
+            return
+        
+        onnx_path = self._onnx_path(model_path)
+        if not os.path.exists(onnx_path):
+            return
+        if os.path.getmtime(onnx_path) < os.path.getmtime(model_path):
+            print(f"⚠ Ignoring stale ONNX model {onnx_path}")
+            return
+        
+        self.onnx_session = onnxruntime.InferenceSession(
+            onnx_path, providers=['CPUExecutionProvider']
+        )
+        print(f"ONNX model loaded from {onnx_path}")
+    
+    def _compiled_path(self, path=None):
+        """Path of the compiled tree library that sits next to the pickled model"""
+        if path is None:
+            path = self.model_path
+        return os.path.splitext(path)[0] + '.so'
+    
+    def export_compiled(self, path=None):
+        """
+        Compile the trained trees into a native shared library
+        
+        Every split becomes C code with its threshold inlined, so scoring
+        needs no tree data loads. Requires the optional treelite and
+        tl2cgen packages and a C compiler.
+        
+        Args:
+            path: Output path (defaults to the model path with .so suffix)
+        
+        Returns:
+            str: Path of the written library
+        """
+        if self.model is None:
+            raise ValueError("Model not trained or loaded.")
+        
+        import treelite
+        if tl2cgen is None:
+            raise ImportError("tl2cgen is required to compile the model")
+        
+        if path is None:
+            path = self._compiled_path()
+        
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tl2cgen.export_lib(
+            treelite.sklearn.import_model(self.model),
+            toolchain='gcc',
+            libpath=path,
+            params={'parallel_comp': 4}
+        )
+        print(f"Compiled model saved to {path}")
+        
+        self.compiled_predictor = _open_compiled_predictor(path)
+        return path
+    
+    def _load_compiled_predictor(self, model_path):
+        """Use the compiled library of a model if it exists and is up to date"""
+        self.compiled_predictor = None
+        if tl2cgen is None:
+            return
+        
+        compiled_path = self._compiled_path(model_path)
+        if not os.path.exists(compiled_path):
+            return
+        if os.path.getmtime(compiled_path) < os.path.getmtime(model_path):
+            print(f"⚠ Ignoring stale compiled model {compiled_path}")
+            return
+        
+        self.compiled_predictor = _open_compiled_predictor(compiled_path)
+        print(f"Compiled model loaded from {compiled_path}")
     
     def get_feature_importance(self):
         """Get feature importance scores"""
         if self.model is None:
             raise ValueError("Model not trained or loaded.")
         
-        importances = self.model.feature_importances_
+        importances = getattr(self.model, 'feature_importances_', None)
+        if importances is None:
+            importances = self.permutation_importances
+        if importances is None:
+            raise ValueError("Model has no feature importances; train it first.")
         
         if self.feature_names:
             feature_importance = dict(zip(self.feature_names, importances))
@@ -5,16 +5,33 @@ Run various test cases to validate the model
 
 import sys
 import os
+import hashlib
 import requests
 import json
+import numpy as np
+import orjson
+from joblib import Memory
+from requests.adapters import HTTPAdapter
 
 # Test if running API or direct model
 USE_API = False  # Set to True to test API, False to test model directly
 
 if not USE_API:
-    from src.feature_extractor import EmailFeatureExtractor
+    import src.feature_extractor
+    import src._fast
+    from src.feature_extractor import EmailFeatureExtractor, FEATURE_NAMES
     from src.phishing_detector import PhishingDetector
 
+# Reuse keep-alive connections to the API across requests
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_maxsize=16))
+
+# On-disk memo of test email features, reused across test runs
+feature_cache = Memory('.feat_cache', verbose=0)
+
+# Precomputed test feature matrices (tools/generate_test_fixtures.py)
+FIXTURE_DIR = os.path.join('data', 'fixtures')
+
 
 # Test cases
 TEST_EMAILS = [
@@ -68,7 +85,7 @@ TEST_EMAILS = [
 
 def test_with_api():
     """Test using the API endpoint"""
-    API_URL = 'http://localhost:5000/detect'
+    API_URL = 'http://localhost:5000/batch-detect'
     
     print("=" * 70)
     print("TESTING PHISHING DETECTION API")
@@ -76,8 +93,8 @@ def test_with_api():
     
     # Check API health
     try:
-        response = requests.get('http://localhost:5000/health')
-        health = response.json()
+        response = SESSION.get('http://localhost:5000/health')
+        health = orjson.loads(response.content)
         print(f"\n✓ API Status: {health['status']}")
         print(f"✓ Model Loaded: {health['model_loaded']}\n")
     except requests.exceptions.ConnectionError:
@@ -85,6 +102,17 @@ def test_with_api():
         print("  Please start the API server first: python app.py\n")
         return
     
+    # Send every test email in one /batch-detect request
+    try:
+        response = SESSION.post(
+            API_URL,
+            data=orjson.dumps({'emails': [test['email'] for test in TEST_EMAILS]}),
+            headers={'Content-Type': 'application/json'}
+        )
+        batch_results = orjson.loads(response.content)['results']
+    except Exception as e:
+        batch_results = [{'error': str(e)}] * len(TEST_EMAILS)
+    
     results = []
     
     for i, test in enumerate(TEST_EMAILS, 1):
@@ -92,8 +120,9 @@ def test_with_api():
         print("-" * 70)
         
         try:
-            response = requests.post(API_URL, json=test['email'])
-            result = response.json()
+            result = batch_results[i - 1]
+            if 'error' in result:
+                raise RuntimeError(result['error'])
             
             prediction = result['prediction']
             confidence = result['confidence']
@@ -126,8 +155,47 @@ def test_with_api():
     print("=" * 70 + "\n")
 
 
-def test_with_model():
-    """Test using the model directly"""
+@feature_cache.cache(ignore=['extractor'])
+def extract_test_features(extractor, emails, extractor_version):
+    """
+    Feature matrix for the test emails, cached on disk
+    
+    extractor_version is part of the cache key so that any edit to the
+    feature extraction code invalidates cached results.
+    """
+    X, _ = extractor.extract_features_batch(emails, n_jobs=-1)
+    return X
+
+
+def feature_extractor_version():
+    """Digest of the feature extraction source files"""
+    digest = hashlib.blake2b(digest_size=16)
+    for module in (src.feature_extractor, src._fast):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def features_fixture_path():
+    """
+    Path of the precomputed test feature matrix
+    
+    Written by tools/generate_test_fixtures.py. The name is keyed on
+    TEST_EMAILS and the feature extraction source, so a stale fixture is
+    never picked up.
+    """
+    digest = hashlib.blake2b(orjson.dumps(TEST_EMAILS), digest_size=8)
+    digest.update(feature_extractor_version().encode())
+    return os.path.join(FIXTURE_DIR, f'test_features-{digest.hexdigest()}.npy')
+
+
+def test_with_model(use_onnx=False):
+    """
+    Test using the model directly
+    
+    Args:
+        use_onnx: Score with the ONNX Runtime export instead of sklearn
+    """
     print("=" * 70)
     print("TESTING PHISHING DETECTION MODEL (Direct)")
     print("=" * 70)
@@ -137,11 +205,42 @@ def test_with_model():
         extractor = EmailFeatureExtractor()
         detector = PhishingDetector()
         detector.load_model()
+        detector.check_feature_order(FEATURE_NAMES)
         print("\n✓ Model loaded successfully\n")
     except FileNotFoundError:
         print("\n✗ Error: Model not found.")
         print("  Please train the model first: python train_model.py\n")
         return
+    except ValueError as e:
+        print(f"\n✗ Error: {e}\n")
+        return
+    
+    if use_onnx:
+        try:
+            if detector.onnx_session is None:
+                detector.export_onnx()
+        except ImportError:
+            print("✗ Error: --onnx needs skl2onnx and onnxruntime installed.\n")
+            return
+        if detector.onnx_session is None:
+            print("✗ Error: --onnx needs onnxruntime installed.\n")
+            return
+        print("✓ Using ONNX Runtime backend\n")
+    else:
+        detector.onnx_session = None  # Test the in-process model itself
+    
+    # Score every test email with a single predict call
+    try:
+        fixture_path = features_fixture_path()
+        if os.path.exists(fixture_path):
+            X = np.load(fixture_path, mmap_mode='r')
+        else:
+            X = extract_test_features(
+                extractor, [test['email'] for test in TEST_EMAILS], feature_extractor_version()
+            )
+        batch_results = detector.predict_batch(X)
+    except Exception as e:
+        batch_results = [{'error': str(e)}] * len(TEST_EMAILS)
     
     results = []
     
@@ -150,11 +249,9 @@ def test_with_model():
         print("-" * 70)
         
         try:
-            # Extract features
-            features = extractor.extract_features(test['email'])
-            
-            # Make prediction
-            result = detector.predict(features)
+            result = batch_results[i - 1]
+            if 'error' in result:
+                raise RuntimeError(result['error'])
             
             prediction = result['prediction']
             confidence = result['confidence'] * 100
@@ -191,4 +288,4 @@ if __name__ == '__main__':
     if USE_API:
         test_with_api()
     else:
-        test_with_model()
+        test_with_model(use_onnx='--onnx' in sys.argv[1:])
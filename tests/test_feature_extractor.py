@@ -0,0 +1,36 @@
+"""
+Checks for EmailFeatureExtractor
+Run from the repository root: python -m unittest discover -s tests -t .
+"""
+
+import unittest
+
+from src.feature_extractor import EmailFeatureExtractor
+
+
+class SenderValidTest(unittest.TestCase):
+
+    def setUp(self):
+        self.extractor = EmailFeatureExtractor()
+
+    def test_regex_and_strict_modes_agree(self):
+        cases = {
+            'alice@example.com': 1,
+            'alice@example.com\n': 0,
+            'alice@example.com\r\n': 0,
+            'alice example.com': 0,
+            'alice@@example.com': 0,
+            'alice@example': 0,
+        }
+        for sender, expected in cases.items():
+            with self.subTest(sender=sender):
+                self.assertEqual(self.extractor._is_valid_email(sender), expected)
+                self.assertEqual(self.extractor._is_valid_email(sender, strict=True), expected)
+
+    def test_malformed_domain_is_rejected(self):
+        # Would backtrack quadratically without the lookahead in _EMAIL_RE
+        self.assertEqual(self.extractor._is_valid_email('a@' + '.' * 100000 + '@'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
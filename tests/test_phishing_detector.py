@@ -0,0 +1,129 @@
+"""
+Checks for the PhishingDetector inference paths
+Run from the repository root: python -m unittest discover -s tests -t .
+"""
+
+import copy
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from src.feature_extractor import FEATURE_NAMES
+from src.phishing_detector import PhishingDetector
+
+
+def make_data(n_samples=2000, n_features=8, seed=0):
+    """Noisy binary problem that grows trees well past depth 8"""
+    rng = np.random.RandomState(seed)
+    X = rng.rand(n_samples, n_features).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + 0.3 * rng.rand(n_samples) > 0.9).astype(int)
+    return X, y
+
+
+def leaf_aggregate_proba(model, X, max_depth):
+    """
+    Phishing probability of a forest whose walks stop at max_depth
+
+    Walks the uncut trees and stops at max_depth, averaging the class
+    distribution stored at the node each walk ends on.
+    """
+    phishing = np.zeros(len(X))
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        for i, row in enumerate(X):
+            node, depth = 0, 0
+            while tree.children_left[node] != -1 and depth < max_depth:
+                if row[tree.feature[node]] <= tree.threshold[node]:
+                    node = tree.children_left[node]
+                else:
+                    node = tree.children_right[node]
+                depth += 1
+            value = tree.value[node, 0]
+            phishing[i] += value[1] / value.sum()
+    return phishing / len(model.estimators_)
+
+
+class PruneForInferenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.model_path = os.path.join(self.tmpdir.name, 'model.pkl')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_cut_forest_matches_leaf_aggregate(self):
+        X, y = make_data()
+        X_test, _ = make_data(n_samples=300, seed=1)
+        detector = PhishingDetector(model_path=self.model_path)
+        detector.model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+        expected = leaf_aggregate_proba(copy.deepcopy(detector.model), X_test, 3)
+
+        self.assertGreater(detector.prune_for_inference(3), 0)
+        self.assertEqual(detector.prune_for_inference(3), 0)
+
+        np.testing.assert_array_equal(detector.model.predict_proba(X_test)[:, 1], expected)
+        np.testing.assert_array_equal(detector.predict_flat(X_test)[:, 1], expected)
+        for estimator in detector.model.estimators_:
+            self.assertLessEqual(estimator.get_depth(), 3)
+            # Dropped subtrees leave no nodes behind
+            self.assertLessEqual(estimator.tree_.node_count, 2 ** 4 - 1)
+
+    def test_train_cuts_below_fit_depth(self):
+        X, y = make_data()
+        detector = PhishingDetector(model_path=self.model_path)
+        detector.train(X, y)
+
+        depths = [estimator.get_depth() for estimator in detector.model.estimators_]
+        self.assertEqual(max(depths), PhishingDetector.INFERENCE_MAX_DEPTH)
+        self.assertAlmostEqual(sum(detector.get_feature_importance().values()), 1.0)
+
+
+class CompiledPredictorTest(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            import treelite  # noqa: F401
+            import tl2cgen  # noqa: F401
+        except ImportError:
+            self.skipTest("treelite and tl2cgen are not installed")
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_matches_predict_flat(self):
+        X, y = make_data(n_features=len(FEATURE_NAMES))
+        detector = PhishingDetector(model_path=os.path.join(self.tmpdir.name, 'model.pkl'))
+        detector.train(X, y, feature_names=FEATURE_NAMES)
+        detector.export_compiled(os.path.join(self.tmpdir.name, 'model.so'))
+
+        X_test, _ = make_data(n_samples=300, n_features=len(FEATURE_NAMES), seed=1)
+        compiled = detector._predict_proba(X_test)
+        np.testing.assert_allclose(compiled, detector.predict_flat(X_test), rtol=0, atol=1e-12)
+
+class FeatureOrderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.detector = PhishingDetector(model_path=os.path.join(self.tmpdir.name, 'model.pkl'))
+        self.X, self.y = make_data(n_samples=200, n_features=len(FEATURE_NAMES))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_extractor_order_is_accepted(self):
+        self.detector.train(self.X, self.y, feature_names=FEATURE_NAMES)
+        self.detector.check_feature_order(FEATURE_NAMES)
+
+    def test_other_order_is_rejected(self):
+        self.detector.train(self.X, self.y, feature_names=FEATURE_NAMES[::-1])
+        with self.assertRaises(ValueError):
+            self.detector.check_feature_order(FEATURE_NAMES)
+
+
+if __name__ == '__main__':
+    unittest.main()
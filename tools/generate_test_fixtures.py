@@ -0,0 +1,29 @@
+"""
+Precompute the feature matrix of the test_detector test emails
+Run from the repository root: python tools/generate_test_fixtures.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from src.feature_extractor import EmailFeatureExtractor
+from test_detector import TEST_EMAILS, FIXTURE_DIR, features_fixture_path
+
+
+def generate_test_fixtures():
+    """Extract TEST_EMAILS features once and save them as a float32 .npy"""
+    extractor = EmailFeatureExtractor()
+    X, _ = extractor.extract_features_batch([test['email'] for test in TEST_EMAILS])
+
+    path = features_fixture_path()
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    np.save(path, X)
+    print(f"✓ Saved {X.shape[0]} x {X.shape[1]} test features to {path}")
+
+
+if __name__ == '__main__':
+    generate_test_fixtures()
@@ -4,16 +4,23 @@ Train the phishing detection model using sample data
 
 import sys
 import os
-import pandas as pd
 import numpy as np
+from itertools import islice
 
 from src.feature_extractor import EmailFeatureExtractor
-from src.phishing_detector import PhishingDetector
-from data.sample_emails import get_training_data
+from src.phishing_detector import PhishingDetector, MODEL_TYPES
+from data.sample_emails import count_training_data, iter_training_data
 
 
-def train_model():
-    """Train the phishing detection model"""
+def train_model(data_path=None, model_type='random_forest'):
+    """
+    Train the phishing detection model
+    
+    Args:
+        data_path: Optional Parquet dataset to train on instead of the
+                   built-in sample emails
+        model_type: 'random_forest' or 'hist_gradient_boosting'
+    """
     print("=" * 60)
     print("EMAIL PHISHING DETECTION - Model Training")
     print("=" * 60)
@@ -21,36 +28,37 @@ def train_model():
     # Initialize components
     extractor = EmailFeatureExtractor()
     detector = PhishingDetector()
+    detector.reset_model(model_type)  # Retrain from scratch, not the saved model
     
     # Load training data
     print("\n[1/4] Loading training data...")
-    emails = get_training_data()
-    print(f"✓ Loaded {len(emails)} email samples")
+    n_emails = count_training_data(data_path)
+    print(f"✓ Found {n_emails} email samples")
     
-    # Extract features from all emails
+    # Stream emails straight into preallocated feature and label arrays
     print("\n[2/4] Extracting features from emails...")
-    features_list = []
-    labels = []
+    y = np.empty(n_emails, dtype=np.int8)
     
-    for email in emails:
-        features = extractor.extract_features(email)
-        features_list.append(features)
-        labels.append(email['label'])
+    def labelled_emails():
+        for i, email in enumerate(iter_training_data(data_path)):
+            y[i] = email['label']
+            yield email
     
-    # Convert to DataFrame
-    X = pd.DataFrame(features_list)
-    y = np.array(labels)
+    X, feature_names = extractor.extract_features_batch(
+        labelled_emails(), n_jobs=-1, count=n_emails
+    )
     
-    print(f"✓ Extracted {len(X.columns)} features from each email")
-    print(f"  - Phishing emails: {sum(y == 1)}")
-    print(f"  - Legitimate emails: {sum(y == 0)}")
+    print(f"✓ Extracted {len(feature_names)} features from each email")
+    legit_count, phishing_count = np.bincount(y, minlength=2)
+    print(f"  - Phishing emails: {phishing_count}")
+    print(f"  - Legitimate emails: {legit_count}")
     
     # Display some feature names
-    print(f"\nFeature examples: {', '.join(X.columns[:5].tolist())}...")
+    print(f"\nFeature examples: {', '.join(feature_names[:5])}...")
     
     # Train model
-    print("\n[3/4] Training Random Forest model...")
-    metrics = detector.train(X, y, test_size=0.25)
+    print(f"\n[3/4] Training {MODEL_TYPES[model_type]} model...")
+    metrics = detector.train(X, y, test_size=0.25, feature_names=feature_names)
     
     # Save model
     print("\n[4/4] Saving trained model...")
@@ -61,7 +69,7 @@ def train_model():
     print("TOP 10 MOST IMPORTANT FEATURES")
     print("=" * 60)
     feature_importance = detector.get_feature_importance()
-    for i, (feature, importance) in enumerate(list(feature_importance.items())[:10], 1):
+    for i, (feature, importance) in enumerate(islice(feature_importance.items(), 10), 1):
         print(f"{i:2d}. {feature:30s} {importance:.4f}")
     
     print("\n" + "=" * 60)
@@ -72,4 +80,8 @@ def train_model():
 
 
 if __name__ == '__main__':
-    train_model()
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    train_model(
+        args[0] if args else None,
+        model_type='hist_gradient_boosting' if '--hgb' in sys.argv[1:] else 'random_forest'
+    )